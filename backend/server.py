@@ -1,25 +1,41 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, BackgroundTasks, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
 import os
+
+# Pin BLAS/OpenMP pools to one thread before numpy/TensorFlow load;
+# parallelism comes from the worker pools and batched inference, and
+# nested threading only causes oversubscription stalls
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+os.environ.setdefault('MKL_NUM_THREADS', '1')
+os.environ.setdefault('OPENBLAS_NUM_THREADS', '1')
+
+import json
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional
 import uuid
 from datetime import datetime, timedelta
+from functools import lru_cache
+import hashlib
 import bcrypt
-import jwt
-from bson import ObjectId
+from jose import jwt, JWTError
+from bson import ObjectId, Binary
 import threading
 import time
 import base64
-from io import BytesIO
-from PIL import Image
+import gzip
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import numpy as np
+import faiss
 import cv2
+import onnxruntime as ort
 from deepface import DeepFace
 import asyncio
 
@@ -39,8 +55,19 @@ JWT_EXPIRATION_HOURS = 24 * 7  # 7 days
 # Security
 security = HTTPBearer()
 
-# Create the main app without a prefix
-app = FastAPI()
+# Facenet ONNX model used for face embeddings
+FACENET_ONNX_PATH = os.environ.get('FACENET_ONNX_PATH', str(ROOT_DIR / 'facenet.onnx'))
+EMBEDDING_DIM = 128
+
+# On-disk face index: a flat float32 matrix plus a parallel student_id
+# table, memory-mapped at load so frames never touch Mongo for encodings
+FACE_INDEX_VECS_PATH = str(ROOT_DIR / 'faces.f32')
+FACE_INDEX_IDS_PATH = str(ROOT_DIR / 'faces.ids.json')
+
+# Create the main app without a prefix; orjson serializes the large
+# dashboard/attendance responses several times faster than stdlib json
+# and handles datetimes natively
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -97,8 +124,29 @@ class CCTVConfig(BaseModel):
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
+# bcrypt is deliberately slow; remember recent verifications for a short
+# window, keyed by a digest so plaintext passwords aren't held in memory.
+# Bounded like _decode_token's lru_cache: inserts evict expired entries
+# first, then the oldest, so a login spray can't grow memory unboundedly
+_VERIFY_CACHE = {}
+_VERIFY_CACHE_TTL_SECONDS = 300
+_VERIFY_CACHE_MAX_ENTRIES = 10000
+
 def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    key = hashlib.sha256(f"{password}:{hashed}".encode('utf-8')).digest()
+    now = time.time()
+    cached = _VERIFY_CACHE.get(key)
+    if cached and cached[1] > now:
+        return cached[0]
+    result = bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    if len(_VERIFY_CACHE) >= _VERIFY_CACHE_MAX_ENTRIES:
+        for stale in [k for k, (_, exp) in _VERIFY_CACHE.items() if exp <= now]:
+            _VERIFY_CACHE.pop(stale, None)
+        # dicts iterate in insertion order, so the first keys are oldest
+        while len(_VERIFY_CACHE) >= _VERIFY_CACHE_MAX_ENTRIES:
+            _VERIFY_CACHE.pop(next(iter(_VERIFY_CACHE)))
+    _VERIFY_CACHE[key] = (result, now + _VERIFY_CACHE_TTL_SECONDS)
+    return result
 
 def create_token(user_id: str, email: str, role: str) -> str:
     payload = {
@@ -109,173 +157,400 @@ def create_token(user_id: str, email: str, role: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+@lru_cache(maxsize=10000)
+def _decode_token(token: str) -> dict:
+    # Signature check only; expiry is re-checked on every request because
+    # cached payloads outlive their exp
+    return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM], options={"verify_exp": False})
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
+        payload = _decode_token(credentials.credentials)
+    except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get('exp', 0) <= time.time():
+        raise HTTPException(status_code=401, detail="Token expired")
+    return payload
 
 def base64_to_numpy(base64_string: str):
-    """Convert base64 string to numpy array"""
+    """Convert base64 string to numpy array (RGB)"""
     try:
         # Remove data URL prefix if present
         if 'base64,' in base64_string:
             base64_string = base64_string.split('base64,')[1]
-        
+
         img_data = base64.b64decode(base64_string)
-        img = Image.open(BytesIO(img_data))
-        return np.array(img)
+        # Decode straight into a contiguous buffer with libjpeg-turbo
+        img = cv2.imdecode(np.frombuffer(img_data, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
     except Exception as e:
         logging.error(f"Error converting base64 to numpy: {e}")
         return None
 
 def numpy_to_base64(img_array):
-    """Convert numpy array to base64 string"""
+    """Convert numpy array (RGB) to base64 string"""
     try:
-        img = Image.fromarray(img_array)
-        buffer = BytesIO()
-        img.save(buffer, format='JPEG')
-        img_str = base64.b64encode(buffer.getvalue()).decode()
+        bgr = cv2.cvtColor(np.asarray(img_array), cv2.COLOR_RGB2BGR)
+        ok, buffer = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, 85])
+        if not ok:
+            return None
+        img_str = base64.b64encode(buffer.tobytes()).decode()
         return f"data:image/jpeg;base64,{img_str}"
     except Exception as e:
         logging.error(f"Error converting numpy to base64: {e}")
         return None
 
-def extract_face_embedding(img_array):
-    """Extract face embedding using DeepFace"""
+_facenet_session = None
+
+def _facenet_providers():
+    """Pick the fastest available execution providers, GPU first"""
+    available = ort.get_available_providers()
+    providers = []
+    if "TensorrtExecutionProvider" in available:
+        providers.append(("TensorrtExecutionProvider", {"trt_fp16_enable": True}))
+    if "CUDAExecutionProvider" in available:
+        providers.append("CUDAExecutionProvider")
+    providers.append("CPUExecutionProvider")
+    return providers
+
+def _export_facenet_onnx():
+    """One-time export of DeepFace's bundled Facenet weights to ONNX
+
+    DeepFace self-provisions the Keras weights on first use; converting
+    them here keeps a fresh checkout runnable without a separate model
+    download or conversion step.
+    """
+    import tensorflow as tf
+    import tf2onnx
+    from deepface.modules import modeling
+
+    logging.info(f"Exporting Facenet weights to {FACENET_ONNX_PATH} (one-time)")
+    model = modeling.build_model("facial_recognition", "Facenet").model
+    spec = (tf.TensorSpec((None, 160, 160, 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, output_path=FACENET_ONNX_PATH)
+
+def _get_facenet_session():
+    """Return the shared ONNX Runtime session, creating it on first use"""
+    global _facenet_session
+    if _facenet_session is None:
+        if not os.path.exists(FACENET_ONNX_PATH):
+            _export_facenet_onnx()
+        providers = _facenet_providers()
+        _facenet_session = ort.InferenceSession(FACENET_ONNX_PATH, providers=providers)
+        logging.info(f"Facenet session using providers: {_facenet_session.get_providers()}")
+    return _facenet_session
+
+def detect_face_crops(img_array, enforce_detection=False):
+    """Detect faces in an image and return RGB crops"""
     try:
-        # DeepFace expects BGR format
-        embedding = DeepFace.represent(img_array, model_name='Facenet', enforce_detection=False)[0]['embedding']
-        return embedding
+        faces = DeepFace.extract_faces(img_array, enforce_detection=enforce_detection)
+    except ValueError:
+        # enforce_detection signals "no face found" via ValueError;
+        # routine for CCTV frames of an empty room
+        return []
     except Exception as e:
-        logging.error(f"Error extracting face embedding: {e}")
-        return None
+        logging.error(f"Error detecting faces: {e}")
+        return []
+    return [(face['face'] * 255).astype(np.uint8) for face in faces]
+
+def _load_face_index():
+    """Memory-map the on-disk face index; returns (matrix, student_ids)"""
+    try:
+        if os.path.exists(FACE_INDEX_VECS_PATH) and os.path.exists(FACE_INDEX_IDS_PATH):
+            with open(FACE_INDEX_IDS_PATH) as f:
+                student_ids = json.load(f)
+            if student_ids:
+                matrix = np.memmap(FACE_INDEX_VECS_PATH, dtype=np.float32, mode='r',
+                                   shape=(len(student_ids), EMBEDDING_DIM))
+                return matrix, student_ids
+    except Exception as e:
+        logging.error(f"Error loading face index: {e}")
+    return None, []
 
-def compare_faces(embedding1, embedding2, threshold=0.6):
-    """Compare two face embeddings"""
+def _save_face_index(matrix, student_ids):
+    """Persist the face index matrix and student_id table to disk"""
     try:
-        # Calculate cosine similarity
-        embedding1 = np.array(embedding1)
-        embedding2 = np.array(embedding2)
-        similarity = np.dot(embedding1, embedding2) / (np.linalg.norm(embedding1) * np.linalg.norm(embedding2))
-        return similarity > threshold
+        np.asarray(matrix, dtype=np.float32).tofile(FACE_INDEX_VECS_PATH)
+        with open(FACE_INDEX_IDS_PATH, 'w') as f:
+            json.dump(student_ids, f)
     except Exception as e:
-        logging.error(f"Error comparing faces: {e}")
-        return False
+        logging.error(f"Error saving face index: {e}")
+
+def _append_face_index(student_id, vectors):
+    """Append newly enrolled embeddings to the on-disk face index"""
+    rows = np.asarray(vectors, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    matrix, student_ids = _load_face_index()
+    if matrix is None:
+        combined = rows
+        student_ids = []
+    else:
+        combined = np.vstack([np.asarray(matrix), rows])
+        student_ids = list(student_ids)
+    student_ids.extend([student_id] * len(rows))
+    _save_face_index(combined, student_ids)
+
+async def rebuild_face_index():
+    """Rebuild the on-disk face index from Mongo and return it"""
+    face_encodings_list = await db.face_encodings.find({}).to_list(length=1000)
+
+    rows = []
+    student_ids = []
+    for stored in face_encodings_list:
+        for stored_embedding in stored['embeddings']:
+            rows.append(dequantize_embedding(stored_embedding))
+            student_ids.append(stored['student_id'])
+
+    if not rows:
+        return None, []
+
+    matrix = np.asarray(rows, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.maximum(norms, 1e-12)
+    _save_face_index(matrix, student_ids)
+    return matrix, student_ids
+
+# Worker pool for CPU-bound photo decoding and face detection, so
+# enrollment requests don't block the event loop on one core
+_DECODE_POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+# Single worker owning the inference session: batches run one at a time
+# off the event loop without fighting the decode pool for cores
+_EMBED_POOL = ThreadPoolExecutor(max_workers=1)
+
+def _decode_and_detect(photo_base64):
+    """Decode a base64 photo and return the first detected face crop"""
+    img_array = base64_to_numpy(photo_base64)
+    if img_array is None:
+        return None
+    faces = detect_face_crops(img_array)
+    return faces[0] if faces else None
+
+def embed_batch(imgs):
+    """Embed a batch of face crops with a single ONNX Runtime call"""
+    sess = _get_facenet_session()
+    batch = np.stack([cv2.resize(img, (160, 160)) for img in imgs]).astype(np.float32)
+    batch = (batch - 127.5) / 128.0
+    input_name = sess.get_inputs()[0].name
+    embeddings = sess.run(None, {input_name: batch})[0]
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+def quantize_embedding(embedding):
+    """Quantize a unit embedding to int8 with a symmetric per-vector scale"""
+    e = np.asarray(embedding, dtype=np.float32)
+    scale = float(np.max(np.abs(e))) / 127.0 or 1.0
+    q = np.round(e / scale).astype(np.int8)
+    return {"q": Binary(q.tobytes()), "scale": scale}
+
+def dequantize_embedding(stored):
+    """Reconstruct a float32 embedding from its int8 quantized form"""
+    if isinstance(stored, dict):
+        return np.frombuffer(stored["q"], dtype=np.int8).astype(np.float32) * stored["scale"]
+    # Embeddings enrolled before quantization are plain float lists
+    return np.asarray(stored, dtype=np.float32)
 
 # ============= Background CCTV Processing =============
 
 class CCTVProcessor:
+    # Similarity threshold for a detected face to count as a match
+    MATCH_THRESHOLD = 0.6
+    # How long the cached embedding matrix stays valid before re-reading Mongo
+    CACHE_TTL_SECONDS = 60
+
     def __init__(self):
         self.is_running = False
         self.thread = None
         self.stream_url = None
-        
+        # Long-lived event loop for frame coroutines, so Motor keeps one
+        # connection pool instead of rebuilding it per frame
+        self._loop = None
+        self._loop_thread = None
+        # Cached copy of all stored embeddings as one L2-normalized float32
+        # matrix of shape (total_embeddings, 128), with a parallel list
+        # mapping each row to its student_id
+        self._stored_matrix = None
+        self._stored_student_ids = []
+        self._faiss_index = None
+        self._cache_loaded_at = 0.0
+        # Change-stream subscription keeping the cache fresh; when it is
+        # live the TTL refresh is skipped entirely
+        self._watch_future = None
+        self._change_stream_active = False
+
     def start(self, stream_url: str):
         if not self.is_running:
             self.stream_url = stream_url
             self.is_running = True
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(target=self._run_loop, daemon=True)
+            self._loop_thread.start()
             self.thread = threading.Thread(target=self._process_stream, daemon=True)
             self.thread.start()
+            self._watch_future = asyncio.run_coroutine_threadsafe(self._watch_face_encodings(), self._loop)
             logging.info(f"CCTV processor started with URL: {stream_url}")
-    
+
     def stop(self):
         self.is_running = False
         if self.thread:
             self.thread.join(timeout=5)
+        if self._watch_future:
+            self._watch_future.cancel()
+            self._watch_future = None
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(timeout=5)
         logging.info("CCTV processor stopped")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
     
     def _process_stream(self):
         """Process CCTV stream and mark attendance"""
         cap = None
         try:
             cap = cv2.VideoCapture(self.stream_url)
-            frame_count = 0
-            
+
             while self.is_running:
-                ret, frame = cap.read()
+                # grab() demuxes without running the H.264 decoder, so 29
+                # of every 30 frames are skipped for free; only the frame
+                # we keep is decoded by retrieve()
+                grabbed = False
+                for _ in range(30):
+                    grabbed = cap.grab()
+                    if not grabbed:
+                        break
+
+                ret, frame = cap.retrieve() if grabbed else (False, None)
                 if not ret:
                     logging.warning("Failed to read frame from CCTV stream")
                     time.sleep(5)
+                    cap.release()
                     cap = cv2.VideoCapture(self.stream_url)
                     continue
-                
-                # Process every 30th frame (reduce CPU usage)
-                frame_count += 1
-                if frame_count % 30 != 0:
-                    continue
-                
-                # Detect and recognize faces
-                asyncio.run(self._process_frame(frame))
-                
-                time.sleep(1)  # Process 1 frame per second
-                
+
+                # Detect and recognize faces on the persistent loop
+                asyncio.run_coroutine_threadsafe(self._process_frame(frame), self._loop).result()
+
         except Exception as e:
             logging.error(f"Error in CCTV processing: {e}")
         finally:
             if cap:
                 cap.release()
     
+    def _set_stored_matrix(self, matrix, student_ids):
+        """Swap in a new embedding matrix and rebuild the FAISS index"""
+        self._stored_matrix = matrix
+        self._stored_student_ids = student_ids
+        if matrix is not None and len(matrix):
+            index = faiss.IndexFlatIP(EMBEDDING_DIM)
+            index.add(np.ascontiguousarray(matrix, dtype=np.float32))
+            self._faiss_index = index
+        else:
+            self._faiss_index = None
+
+    def _append_cached_rows(self, student_id, embeddings):
+        """Append freshly enrolled embeddings to the in-memory cache"""
+        rows = np.asarray([dequantize_embedding(e) for e in embeddings], dtype=np.float32)
+        rows /= np.maximum(np.linalg.norm(rows, axis=1, keepdims=True), 1e-12)
+        if self._stored_matrix is None:
+            self._set_stored_matrix(rows, [student_id] * len(rows))
+            return
+        self._stored_matrix = np.vstack([np.asarray(self._stored_matrix), rows])
+        self._stored_student_ids = list(self._stored_student_ids) + [student_id] * len(rows)
+        self._faiss_index.add(np.ascontiguousarray(rows))
+
+    async def _watch_face_encodings(self):
+        """Keep the cached matrix in sync via a Mongo change stream"""
+        try:
+            async with db.face_encodings.watch([], full_document='updateLookup') as stream:
+                self._change_stream_active = True
+                async for change in stream:
+                    if change['operationType'] == 'insert':
+                        doc = change['fullDocument']
+                        self._append_cached_rows(doc['student_id'], doc['embeddings'])
+                    else:
+                        # Updates and deletes are rare; rebuild wholesale
+                        self._set_stored_matrix(*await rebuild_face_index())
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Change streams need a replica set; fall back to TTL refresh
+            logging.warning(f"face_encodings change stream unavailable, using TTL refresh: {e}")
+        finally:
+            self._change_stream_active = False
+
+    async def _refresh_stored_embeddings(self):
+        """Reload the stored embedding matrix from the on-disk face index"""
+        matrix, student_ids = _load_face_index()
+        if matrix is None:
+            # No index on disk yet; rebuild it from Mongo once
+            matrix, student_ids = await rebuild_face_index()
+
+        self._set_stored_matrix(matrix, student_ids)
+        self._cache_loaded_at = time.time()
+
     async def _process_frame(self, frame):
         """Process a single frame and mark attendance"""
         try:
-            # Get all face encodings from database
-            face_encodings_cursor = db.face_encodings.find({})
-            face_encodings_list = await face_encodings_cursor.to_list(length=1000)
-            
-            if not face_encodings_list:
+            # Steady state does no storage I/O: the change-stream handler
+            # mutates the cache as enrollments land. We only load when
+            # nothing is cached yet, or the stream is down and the TTL
+            # has lapsed
+            if self._faiss_index is None:
+                await self._refresh_stored_embeddings()
+            elif not self._change_stream_active and (time.time() - self._cache_loaded_at) > self.CACHE_TTL_SECONDS:
+                await self._refresh_stored_embeddings()
+
+            if self._faiss_index is None:
                 return
-            
-            # Try to detect faces in frame
-            try:
-                # Extract face embeddings from current frame
-                detected_embeddings = DeepFace.represent(frame, model_name='Facenet', enforce_detection=True)
-            except:
+
+            # Detect faces, then embed all crops in one batched model call
+            crops = detect_face_crops(frame, enforce_detection=True)
+            if not crops:
                 return  # No faces detected
-            
-            today = datetime.utcnow().strftime('%Y-%m-%d')
-            
-            # Match each detected face
-            for detected in detected_embeddings:
-                detected_embedding = detected['embedding']
-                
-                # Compare with stored embeddings
-                for stored in face_encodings_list:
-                    student_id = stored['student_id']
-                    
-                    # Check if already marked present today
-                    existing_attendance = await db.attendance.find_one({
-                        'student_id': student_id,
-                        'date': today
-                    })
-                    
-                    if existing_attendance and existing_attendance.get('status') == 'present':
-                        continue
-                    
-                    # Compare each stored encoding with detected face
-                    for stored_embedding in stored['embeddings']:
-                        if compare_faces(detected_embedding, stored_embedding):
-                            # Mark attendance
-                            await db.attendance.update_one(
-                                {'student_id': student_id, 'date': today},
-                                {
-                                    '$set': {
-                                        'student_id': student_id,
-                                        'date': today,
-                                        'status': 'present',
-                                        'marked_by': 'auto',
-                                        'timestamp': datetime.utcnow()
-                                    }
-                                },
-                                upsert=True
-                            )
-                            logging.info(f"Marked attendance for student: {student_id}")
-                            break
-        
+            detected = await asyncio.get_running_loop().run_in_executor(_EMBED_POOL, embed_batch, crops)
+
+            # One clock read per frame; f-string formatting skips the
+            # locale machinery strftime drags in
+            now = datetime.utcnow()
+            today = f"{now.year:04d}-{now.month:02d}-{now.day:02d}"
+
+            # Top-1 inner-product search over the FAISS index; embeddings
+            # are unit vectors, so inner product is cosine similarity
+            sims, rows = self._faiss_index.search(np.ascontiguousarray(detected, dtype=np.float32), 1)
+            best = rows[:, 0]
+            mask = sims[:, 0] > self.MATCH_THRESHOLD
+            matched_ids = {self._stored_student_ids[i] for i in best[mask]}
+
+            if not matched_ids:
+                return
+
+            # Mark all matched students with one bulk upsert; $setOnInsert
+            # makes re-marking an already-present student a no-op, so no
+            # per-student existence check is needed. Auto marks are
+            # day-scoped: period=None keeps them distinct from teacher
+            # overrides under the (student_id, date, period) unique index
+            ops = [
+                UpdateOne(
+                    {'student_id': student_id, 'date': today, 'period': None},
+                    {
+                        '$setOnInsert': {
+                            'status': 'present',
+                            'marked_by': 'auto',
+                            'timestamp': now
+                        }
+                    },
+                    upsert=True
+                )
+                for student_id in matched_ids
+            ]
+            result = await db.attendance.bulk_write(ops, ordered=False)
+            if result.upserted_count:
+                logging.info(f"Marked attendance for students: {sorted(matched_ids)}")
+
         except Exception as e:
             logging.error(f"Error processing frame: {e}")
 
@@ -395,14 +670,22 @@ async def bulk_upload_students(students: List[StudentUpload], current_user: dict
             }
             await db.users.insert_one(user_doc)
             
-            # Process face images and create embeddings
+            # Decode and detect across all cores, then embed every
+            # detected face in one batch
+            loop = asyncio.get_running_loop()
+            decoded = await asyncio.gather(*[
+                loop.run_in_executor(_DECODE_POOL, _decode_and_detect, photo_base64)
+                for photo_base64 in student_data.photos
+            ])
+            crops = [crop for crop in decoded if crop is not None]
+
             embeddings = []
-            for photo_base64 in student_data.photos:
-                img_array = base64_to_numpy(photo_base64)
-                if img_array is not None:
-                    embedding = extract_face_embedding(img_array)
-                    if embedding:
-                        embeddings.append(embedding)
+            vectors = None
+            if crops:
+                # Store quantized unit vectors: 128 bytes per
+                # embedding instead of 1 KB of BSON doubles
+                vectors = await loop.run_in_executor(_EMBED_POOL, embed_batch, crops)
+                embeddings = [quantize_embedding(e) for e in vectors]
             
             if embeddings:
                 # Store face encodings
@@ -414,6 +697,8 @@ async def bulk_upload_students(students: List[StudentUpload], current_user: dict
                     "created_at": datetime.utcnow()
                 }
                 await db.face_encodings.insert_one(face_doc)
+                # Keep the on-disk face index in step with Mongo
+                _append_face_index(student_data.student_id, vectors)
                 results.append({"student_id": student_data.student_id, "status": "success", "embeddings_count": len(embeddings)})
             else:
                 results.append({"student_id": student_data.student_id, "status": "no_face_detected"})
@@ -429,24 +714,51 @@ async def get_students(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "teacher":
         raise HTTPException(status_code=403, detail="Only teachers can view all students")
     
-    students = await db.users.find({"role": "student"}).to_list(1000)
-    
-    # Get face enrollment status
-    result = []
-    for student in students:
-        face_encoding = await db.face_encodings.find_one({"student_id": student["student_id"]})
-        result.append({
-            "id": student["_id"],
-            "name": student["name"],
-            "email": student["email"],
-            "student_id": student["student_id"],
-            "has_face_encoding": face_encoding is not None
-        })
-    
-    return result
+    # Join face enrollment status in a single aggregation instead of a
+    # find_one per student
+    pipeline = [
+        {"$match": {"role": "student"}},
+        {"$lookup": {
+            "from": "face_encodings",
+            "localField": "student_id",
+            "foreignField": "student_id",
+            "as": "face"
+        }},
+        {"$project": {
+            "_id": 0,
+            "id": "$_id",
+            "name": 1,
+            "email": 1,
+            "student_id": 1,
+            "has_face_encoding": {"$gt": [{"$size": "$face"}, 0]}
+        }}
+    ]
+    return await db.users.aggregate(pipeline).to_list(1000)
 
 # ============= Attendance Routes =============
 
+async def get_attendance_statistics(student_id: str) -> dict:
+    """Compute present/absent counts for a student inside Mongo"""
+    rows = await db.attendance.aggregate([
+        {"$match": {"student_id": student_id}},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "present": {"$sum": {"$cond": [{"$eq": ["$status", "present"]}, 1, 0]}}
+        }}
+    ]).to_list(1)
+
+    total_days = rows[0]["total"] if rows else 0
+    present_days = rows[0]["present"] if rows else 0
+    percentage = (present_days / total_days * 100) if total_days > 0 else 0
+
+    return {
+        "total_days": total_days,
+        "present_days": present_days,
+        "absent_days": total_days - present_days,
+        "percentage": round(percentage, 2)
+    }
+
 @api_router.get("/attendance/student/{student_id}")
 async def get_student_attendance(student_id: str, current_user: dict = Depends(get_current_user)):
     # Students can only view their own attendance
@@ -454,28 +766,20 @@ async def get_student_attendance(student_id: str, current_user: dict = Depends(g
         user = await db.users.find_one({"_id": current_user["user_id"]})
         if user and user.get("student_id") != student_id:
             raise HTTPException(status_code=403, detail="Cannot view other student's attendance")
-    
-    attendance_records = await db.attendance.find({"student_id": student_id}).sort("date", -1).to_list(1000)
-    
+
+    # Statistics are aggregated in Mongo; only the recent records come back
+    statistics = await get_attendance_statistics(student_id)
+    attendance_records = await db.attendance.find({"student_id": student_id}).sort("date", -1).limit(10).to_list(10)
+
     # Convert ObjectIds to strings for JSON serialization
     for record in attendance_records:
         if "_id" in record:
             record["_id"] = str(record["_id"])
-    
-    # Calculate statistics
-    total_days = len(attendance_records)
-    present_days = len([r for r in attendance_records if r["status"] == "present"])
-    percentage = (present_days / total_days * 100) if total_days > 0 else 0
-    
+
     return {
         "student_id": student_id,
         "attendance_records": attendance_records,
-        "statistics": {
-            "total_days": total_days,
-            "present_days": present_days,
-            "absent_days": total_days - present_days,
-            "percentage": round(percentage, 2)
-        }
+        "statistics": statistics
     }
 
 @api_router.post("/attendance/override")
@@ -513,23 +817,28 @@ async def get_all_attendance(date: Optional[str] = None, current_user: dict = De
         # Default to today
         query["date"] = datetime.utcnow().strftime('%Y-%m-%d')
     
-    attendance_records = await db.attendance.find(query).to_list(1000)
-    
-    # Get student details
-    result = []
-    for record in attendance_records:
-        student = await db.users.find_one({"student_id": record["student_id"]})
-        if student:
-            result.append({
-                "student_id": record["student_id"],
-                "student_name": student["name"],
-                "date": record["date"],
-                "status": record["status"],
-                "marked_by": record.get("marked_by", "auto"),
-                "timestamp": record.get("timestamp")
-            })
-    
-    return result
+    # Join student names in a single aggregation instead of a find_one
+    # per attendance record
+    pipeline = [
+        {"$match": query},
+        {"$lookup": {
+            "from": "users",
+            "localField": "student_id",
+            "foreignField": "student_id",
+            "as": "user"
+        }},
+        {"$unwind": "$user"},
+        {"$project": {
+            "_id": 0,
+            "student_id": 1,
+            "student_name": "$user.name",
+            "date": 1,
+            "status": 1,
+            "marked_by": {"$ifNull": ["$marked_by", "auto"]},
+            "timestamp": 1
+        }}
+    ]
+    return await db.attendance.aggregate(pipeline).to_list(1000)
 
 # ============= Curriculum Routes =============
 
@@ -693,18 +1002,15 @@ async def get_student_dashboard(student_id: str, current_user: dict = Depends(ge
         if user and user.get("student_id") != student_id:
             raise HTTPException(status_code=403, detail="Cannot view other student's dashboard")
     
-    # Get attendance records
-    attendance_records = await db.attendance.find({"student_id": student_id}).sort("date", -1).to_list(1000)
-    
+    # Statistics are aggregated in Mongo; only the recent records come back
+    statistics = await get_attendance_statistics(student_id)
+    attendance_records = await db.attendance.find({"student_id": student_id}).sort("date", -1).limit(10).to_list(10)
+
     # Convert ObjectIds to strings for JSON serialization
     for record in attendance_records:
         if "_id" in record:
             record["_id"] = str(record["_id"])
-    
-    total_days = len(attendance_records)
-    present_days = len([r for r in attendance_records if r["status"] == "present"])
-    percentage = (present_days / total_days * 100) if total_days > 0 else 0
-    
+
     # Get recent curriculum
     recent_curriculum = await db.curriculum.find({}).sort("date", -1).limit(10).to_list(10)
     
@@ -715,11 +1021,8 @@ async def get_student_dashboard(student_id: str, current_user: dict = Depends(ge
     
     return {
         "attendance": {
-            "total_days": total_days,
-            "present_days": present_days,
-            "absent_days": total_days - present_days,
-            "percentage": round(percentage, 2),
-            "recent_records": attendance_records[:10]
+            **statistics,
+            "recent_records": attendance_records
         },
         "curriculum": recent_curriculum
     }
@@ -735,7 +1038,7 @@ async def get_teacher_dashboard(current_user: dict = Depends(get_current_user)):
     # Get today's attendance
     today = datetime.utcnow().strftime('%Y-%m-%d')
     today_attendance = await db.attendance.find({"date": today}).to_list(1000)
-    present_today = len([r for r in today_attendance if r["status"] == "present"])
+    present_today = sum(1 for r in today_attendance if r["status"] == "present")
     
     # Get students with face encodings
     students_with_faces = await db.face_encodings.count_documents({})
@@ -755,9 +1058,56 @@ async def get_teacher_dashboard(current_user: dict = Depends(get_current_user)):
         "recent_curriculum": recent_curriculum
     }
 
+class GzipRequestMiddleware:
+    """Transparently decompress gzip-encoded request bodies
+
+    Bulk uploads carry base64 photo payloads that compress 3-5x;
+    clients send them with Content-Encoding: gzip and this middleware
+    inflates the body before routing sees it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (b"content-encoding", b"gzip") not in [
+            (k.lower(), v.lower()) for k, v in scope["headers"]
+        ]:
+            await self.app(scope, receive, send)
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = gzip.decompress(b"".join(chunks))
+
+        scope = dict(scope)
+        scope["headers"] = [
+            (k, v) for k, v in scope["headers"]
+            if k.lower() not in (b"content-encoding", b"content-length")
+        ] + [(b"content-length", str(len(body)).encode())]
+
+        delivered = False
+
+        async def replay():
+            nonlocal delivered
+            if delivered:
+                return {"type": "http.disconnect"}
+            delivered = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        await self.app(scope, replay, send)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(GzipRequestMiddleware)
+# Compress large responses for clients that advertise gzip support;
+# the student list and attendance payloads are base64/JSON heavy
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -780,6 +1130,16 @@ async def shutdown_db_client():
 
 @app.on_event("startup")
 async def startup_event():
+    # One attendance record per student per day per period (the auto
+    # path writes period=None); lets both write paths upsert without a
+    # read-before-write
+    await db.attendance.create_index([("student_id", 1), ("date", 1), ("period", 1)], unique=True)
+    # Hot query fields: every endpoint filters on one of these
+    await db.users.create_index("email", unique=True)
+    await db.users.create_index("student_id")
+    await db.face_encodings.create_index("student_id", unique=True)
+    await db.curriculum.create_index([("date", -1)])
+
     # Check if CCTV should be auto-started
     config = await db.cctv_config.find_one({})
     if config and config.get('is_active'):